@@ -0,0 +1,144 @@
+import re
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Optional
+import numpy as np
+from datasketch import MinHash, MinHashLSH
+
+# Punctuation is dropped before shingling so "List users!" matches "list users"
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+# Values that decide which records a query reads; near-duplicates must agree on them exactly
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+# Words that invert, bound or change the operation of an otherwise similar query,
+# so "is admin" never matches "is not admin" and "show" never matches "remove"
+_EXACT_WORDS = frozenset({
+    "not", "no", "non", "none", "nobody", "never", "without", "except", "excluding", "other", "others",
+    "over", "under", "above", "below", "older", "younger", "greater", "less", "more", "fewer",
+    "least", "most", "before", "after", "between", "only", "all", "any",
+    "create", "add", "insert", "register", "update", "change", "modify", "set",
+    "delete", "remove", "drop", "rid",
+})
+
+def _exact_terms(query: str) -> tuple:
+    """Extract the emails, numbers and key words of a query, order-insensitive
+
+    Args:
+        query (str): User query
+
+    Returns:
+        tuple: Sorted emails, sorted numbers and sorted key words
+    """
+    text = query.lower()
+    emails = _EMAIL_RE.findall(text)
+    rest = _EMAIL_RE.sub(" ", text)
+    numbers = _NUMBER_RE.findall(rest)
+    words = [word for word in _WORD_RE.findall(rest) if word in _EXACT_WORDS or word.endswith("n't")]
+    return tuple(sorted(emails)), tuple(sorted(numbers)), tuple(sorted(words))
+
+class SemanticCache:
+    """LRU cache of agent responses looked up by near-duplicate queries"""
+
+    def __init__(self, threshold=0.9, bands=8, rows=16, max_entries=1024, ttl=300):
+        """Initialize the cache
+
+        Args:
+            threshold (float): Minimum Jaccard similarity for a hit. Defaults to 0.9.
+            bands (int): Number of LSH bands. Defaults to 8.
+            rows (int): Rows per LSH band. Defaults to 16.
+            max_entries (int): Maximum number of cached responses. Defaults to 1024.
+            ttl (int): Seconds a cached response stays valid. Defaults to 300.
+        """
+        self.threshold = threshold
+        self.num_perm = bands * rows
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._params = (bands, rows)
+        self._lsh = MinHashLSH(num_perm=self.num_perm, params=self._params)
+        # MinHash signatures stored row-wise so candidates are compared in one vectorized pass
+        self._signatures = np.zeros((max_entries, self.num_perm), dtype=np.uint64)
+        self._free_rows = list(range(max_entries))
+        # key -> (row, query, response, inserted_at, exact_terms), oldest first
+        self._entries = OrderedDict()
+        self._keys = count()
+
+    def minhash(self, query: str) -> MinHash:
+        """Compute the MinHash of a query over 3-gram shingles
+
+        Args:
+            query (str): User query
+
+        Returns:
+            MinHash: MinHash of the normalized query
+        """
+        text = " ".join(_PUNCTUATION_RE.sub(" ", query.lower()).split())
+        mh = MinHash(num_perm=self.num_perm)
+        for i in range(max(len(text) - 2, 1)):
+            mh.update(text[i:i + 3].encode("utf-8"))
+        return mh
+
+    def query(self, mh: MinHash, query: str, threshold: Optional[float] = None) -> Optional[str]:
+        """Look up the cached response of the most similar query
+
+        Only cached queries with exactly the same emails, numbers and key words
+        can match, so "age over 30" never returns the answer for "age over 40"
+        and "admins" never returns the answer for "not admins".
+
+        Args:
+            mh (MinHash): MinHash of the query
+            query (str): User query
+            threshold (float, optional): Minimum similarity. Defaults to the cache threshold.
+
+        Returns:
+            Optional[str]: Cached response or None on a miss
+        """
+        threshold = self.threshold if threshold is None else threshold
+        now = time.monotonic()
+
+        terms = _exact_terms(query)
+
+        # LSH narrows the search to candidates sharing a band; verify them exactly
+        keys = [
+            key for key in self._lsh.query(mh)
+            if now - self._entries[key][3] <= self.ttl and self._entries[key][4] == terms
+        ]
+        if not keys:
+            return None
+
+        rows = [self._entries[key][0] for key in keys]
+        similarities = (self._signatures[rows] == mh.hashvalues).mean(axis=1)
+        best = int(similarities.argmax())
+        if similarities[best] < threshold:
+            return None
+
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]][2]
+
+    def insert(self, mh: MinHash, query: str, response: str):
+        """Cache a response, evicting the least recently used entries when full
+
+        Args:
+            mh (MinHash): MinHash of the query
+            query (str): User query
+            response (str): Response to cache
+        """
+        if not self._free_rows:
+            evicted, (row, _, _, _, _) = self._entries.popitem(last=False)
+            self._lsh.remove(evicted)
+            self._free_rows.append(row)
+
+        key = f"q{next(self._keys)}"
+        row = self._free_rows.pop()
+        self._signatures[row] = mh.hashvalues
+        self._lsh.insert(key, mh)
+        self._entries[key] = (row, query, response, time.monotonic(), _exact_terms(query))
+
+    def clear(self):
+        """Drop all cached responses"""
+        self._lsh = MinHashLSH(num_perm=self.num_perm, params=self._params)
+        self._free_rows = list(range(self.max_entries))
+        self._entries.clear()
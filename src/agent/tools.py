@@ -1,26 +1,81 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Any, Optional
-import json
-import os
-from src.utils.helpers import load_json_file, save_json_file
+import asyncio
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+import orjson
+from cachetools import TTLCache
+from pymongo.errors import DuplicateKeyError
 from src.rag.retriever import RAGRetriever
 
-# -qU 
+# Seconds without writes before the RAG index is rebuilt
+_REFRESH_DEBOUNCE_SECONDS = 0.5
+
+# User fields accepted from tool input and written to the database
+_USER_FIELDS = {"name", "email", "age", "role"}
+
+# Most users included in a get_users response; the rest are only counted
+_MAX_LISTED_USERS = 50
+
+# Exported user data that the RAG retriever indexes, relative to the repository root
+_JSON_PATH = str(Path(__file__).resolve().parents[2] / "data" / "user.json")
+
+@lru_cache(maxsize=None)
+def _get_retriever(json_path: str) -> RAGRetriever:
+    """Get the RAG retriever for a data file, shared by every caller
+    
+    Args:
+        json_path: Path to the JSON data
+        
+    Returns:
+        RAGRetriever: Retriever built on first use
+    """
+    return RAGRetriever(json_path)
+
+def _to_dict(model: BaseModel, **kwargs) -> Dict[str, Any]:
+    """Dump a Pydantic model to a dict, dropping unset optional fields"""
+    return model.model_dump(exclude_none=True, **kwargs)
 
 class CreateUserInput(BaseModel):
+    """Create a single new user"""
+    model_config = ConfigDict(extra="ignore")
+    
     name: str = Field(..., description="User's full name")
     email: str = Field(..., description="User's email address")
     age: Optional[int] = Field(None, description="User's age")
     role: Optional[str] = Field(None, description="User's role")
 
+class BulkCreateUsersInput(BaseModel):
+    """Create several new users at once"""
+    model_config = ConfigDict(extra="ignore")
+    
+    users: List[CreateUserInput] = Field(..., description="Users to create")
+
 class UpdateUserInput(BaseModel):
+    """Update fields of an existing user identified by email"""
+    model_config = ConfigDict(extra="ignore")
+    
     email: str = Field(..., description="Email of the user to update")
     data: Dict[str, Any] = Field(..., description="Data to update")
 
+class BulkUpdateUsersInput(BaseModel):
+    """Update several existing users at once"""
+    model_config = ConfigDict(extra="ignore")
+    
+    updates: List[UpdateUserInput] = Field(..., description="Updates to apply, one per user")
+
 class DeleteUserInput(BaseModel):
+    """Delete the user identified by email"""
+    model_config = ConfigDict(extra="ignore")
+    
     email: str = Field(..., description="Email of the user to delete")
 
 class GetUsersInput(BaseModel):
+    """Get users, optionally filtered by field values"""
+    model_config = ConfigDict(extra="ignore")
+    
     filters: Optional[Dict[str, Any]] = Field(None, description="Optional filters for the query")
 
 class DatabaseTools:
@@ -33,9 +88,33 @@ class DatabaseTools:
             mongodb_client: MongoDB client instance
         """
         self.mongodb = mongodb_client
-        self.json_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "user.json")
-        # Initialize RAG retriever for refreshing data
-        self.retriever = RAGRetriever(self.json_path)
+        self.json_path = _JSON_PATH
+        # Share one RAG retriever for refreshing data across instances
+        self.retriever = _get_retriever(self.json_path)
+        # Short-lived cache of get_users responses, keyed by filters; cleared on every write
+        self._user_cache = TTLCache(maxsize=256, ttl=5)
+        self._user_cache_lock = threading.Lock()
+        # Writes only mark the RAG index dirty; a background worker coalesces the rebuilds
+        self._refresh_pending = threading.Event()
+        threading.Thread(target=self._refresh_worker, daemon=True).start()
+    
+    def _refresh_worker(self):
+        """Rebuild the RAG index once writes have gone quiet"""
+        while True:
+            self._refresh_pending.wait()
+            
+            # Keep waiting while new writes keep arriving
+            while True:
+                self._refresh_pending.clear()
+                time.sleep(_REFRESH_DEBOUNCE_SECONDS)
+                if not self._refresh_pending.is_set():
+                    break
+            
+            # Wrap in try/except so a failed refresh doesn't kill the worker
+            try:
+                self.retriever.refresh_data()
+            except Exception as e:
+                print(f"Warning: Failed to refresh RAG data: {e}")
     
     def create_user(self, input_data: CreateUserInput) -> str:
         """Create a new user in the database
@@ -46,88 +125,98 @@ class DatabaseTools:
         Returns:
             str: Result message
         """
-        # Convert pydantic model to dict
+        # Convert pydantic model to dict, keeping only the user fields
+        user_data = _to_dict(input_data, include=_USER_FIELDS)
+        
+        # Insert user into database; the unique email index reports duplicates
         try:
-            # Try different pydantic versions
-            if hasattr(input_data, "model_dump"):
-                # Pydantic v2
-                user_data = input_data.model_dump(exclude_none=True)
-            else:
-                # Pydantic v1
-                user_data = input_data.dict(exclude_none=True)
-            
-            # Ensure only relevant fields
-            user_data = {k: v for k, v in user_data.items() if k in ["name", "email", "age", "role"]}
-        except Exception as e:
-            print(f"Error converting model to dict: {e}")
-            # Fallback to manual dictionary creation
-            user_data = {}
-            if hasattr(input_data, "name") and input_data.name:
-                user_data["name"] = input_data.name
-            if hasattr(input_data, "email") and input_data.email:
-                user_data["email"] = input_data.email
-            if hasattr(input_data, "age") and input_data.age is not None:
-                user_data["age"] = input_data.age
-            if hasattr(input_data, "role") and input_data.role:
-                user_data["role"] = input_data.role
-        
-        # Check if user with same email already exists
-        existing_users = self.mongodb.get_users({"email": user_data.get("email")})
-        if existing_users:
+            result = self.mongodb.create_user(user_data)
+        except DuplicateKeyError:
             return f"User with email {user_data.get('email')} already exists."
         
-        # Insert user into database
-        result = self.mongodb.create_user(user_data)
-        
         if result:
-            # Refresh RAG data to maintain consistency - wrap in try/except to prevent cascading errors
-            try:
-                self.retriever.refresh_data()
-            except Exception as e:
-                print(f"Warning: Failed to refresh RAG data: {e}")
+            with self._user_cache_lock:
+                self._user_cache.clear()
             
-            # Serialize the user data safely
-            try:
-                user_json = json.dumps(user_data, default=str)
-            except Exception:
-                # If serialization fails, create a simpler dict
-                simple_data = {
-                    "name": str(user_data.get("name", "")),
-                    "email": str(user_data.get("email", ""))
-                }
-                if "age" in user_data:
-                    simple_data["age"] = int(user_data.get("age", 0))
-                if "role" in user_data:
-                    simple_data["role"] = str(user_data.get("role", ""))
-                user_json = json.dumps(simple_data)
+            # Schedule a RAG refresh to maintain consistency
+            self._refresh_pending.set()
+            
+            # default=str covers ObjectId and other BSON types
+            user_json = orjson.dumps(user_data, default=str).decode()
             
             return f"User created successfully: {user_json}"
         else:
             return "Failed to create user"
     
-    def get_users(self, input_data: Optional[GetUsersInput] = None) -> str:
+    def bulk_create_users(self, input_data: BulkCreateUsersInput) -> str:
+        """Create several users in the database in one round trip
+        
+        Args:
+            input_data: Users to create
+            
+        Returns:
+            str: Result message
+        """
+        users = [_to_dict(user, include=_USER_FIELDS) for user in input_data.users]
+        
+        inserted_ids = self.mongodb.create_users_bulk(users)
+        
+        if inserted_ids:
+            with self._user_cache_lock:
+                self._user_cache.clear()
+            
+            # One RAG refresh for the whole batch
+            self._refresh_pending.set()
+            
+            skipped = len(users) - len(inserted_ids)
+            message = f"Created {len(inserted_ids)} users successfully"
+            if skipped:
+                message += f"; skipped {skipped} with an existing email or missing data"
+            return message
+        else:
+            return "Failed to create users"
+    
+    def get_users(self, input_data: Optional[GetUsersInput] = None, pretty: bool = False) -> str:
         """Get users from the database
         
         Args:
             input_data: Optional filters
+            pretty: Indent the JSON output for display. Defaults to compact output.
             
         Returns:
             str: Result message with users
+            
+        Raises:
+            RuntimeError: If the database query failed, so a failure is never reported as no users.
         """
         filters = None
         if input_data and input_data.filters:
             filters = input_data.filters
         
+        cache_key = (orjson.dumps(filters, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str), pretty)
+        with self._user_cache_lock:
+            cached = self._user_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         users = self.mongodb.get_users(filters)
+        if users is None:
+            raise RuntimeError("Failed to get users from the database")
         
         if users:
-            try:
-                return f"Found {len(users)} users: {json.dumps(users, indent=2, default=str)}"
-            except Exception as e:
-                print(f"Error serializing users: {e}")
-                return f"Found {len(users)} users, but couldn't display them due to serialization error."
+            option = orjson.OPT_NON_STR_KEYS
+            if pretty:
+                option |= orjson.OPT_INDENT_2
+            users_json = orjson.dumps(users[:_MAX_LISTED_USERS], option=option, default=str).decode()
+            response = f"Found {len(users)} users: {users_json}"
+            if len(users) > _MAX_LISTED_USERS:
+                response += f" ... and {len(users) - _MAX_LISTED_USERS} more"
         else:
-            return "No users found"
+            response = "No users found"
+        
+        with self._user_cache_lock:
+            self._user_cache[cache_key] = response
+        return response
     
     def update_user(self, input_data: UpdateUserInput) -> str:
         """Update a user in the database
@@ -141,27 +230,52 @@ class DatabaseTools:
         email = input_data.email
         update_data = input_data.data
         
-        # Check if user exists
-        existing_users = self.mongodb.get_users({"email": email})
-        if not existing_users:
-            return f"User with email {email} not found."
+        # MongoDB rejects an empty $set, so only check existence in that case
+        if not update_data:
+            if not self.mongodb.user_exists(email):
+                return f"User with email {email} not found."
+            return f"No fields provided to update for user {email}."
         
-        result = self.mongodb.update_user(email, update_data)
+        # A single update reports whether any user matched the email; the unique email index reports conflicts
+        try:
+            result = self.mongodb.update_user(email, update_data)
+        except DuplicateKeyError:
+            return f"Cannot update user {email}: a user with email {update_data.get('email')} already exists."
         
         if result:
-            # Refresh RAG data
-            try:
-                self.retriever.refresh_data()
-            except Exception as e:
-                print(f"Warning: Failed to refresh RAG data: {e}")
-                
-            try:
-                return f"User {email} updated successfully with: {json.dumps(update_data, default=str)}"
-            except Exception as e:
-                print(f"Error serializing update data: {e}")
-                return f"User {email} updated successfully."
+            with self._user_cache_lock:
+                self._user_cache.clear()
+            
+            # Schedule a RAG refresh
+            self._refresh_pending.set()
+            
+            return f"User {email} updated successfully with: {orjson.dumps(update_data, default=str).decode()}"
         else:
-            return f"Failed to update user {email}"
+            return f"User with email {email} not found."
+    
+    def bulk_update_users(self, input_data: BulkUpdateUsersInput) -> str:
+        """Update several users in the database in one round trip
+        
+        Args:
+            input_data: User emails and data to update
+            
+        Returns:
+            str: Result message
+        """
+        updates = [(update.email, update.data) for update in input_data.updates]
+        
+        updated = self.mongodb.update_users_bulk(updates)
+        
+        if updated:
+            with self._user_cache_lock:
+                self._user_cache.clear()
+            
+            # One RAG refresh for the whole batch
+            self._refresh_pending.set()
+            
+            return f"Updated {updated} of {len(updates)} users successfully"
+        else:
+            return "No matching users found to update"
     
     def delete_user(self, input_data: DeleteUserInput) -> str:
         """Delete a user from the database
@@ -174,20 +288,43 @@ class DatabaseTools:
         """
         email = input_data.email
         
-        # Check if user exists
-        existing_users = self.mongodb.get_users({"email": email})
-        if not existing_users:
-            return f"User with email {email} not found."
-        
+        # A single delete reports whether any user matched the email
         result = self.mongodb.delete_user(email)
         
         if result:
-            # Refresh RAG data
-            try:
-                self.retriever.refresh_data()
-            except Exception as e:
-                print(f"Warning: Failed to refresh RAG data: {e}")
+            with self._user_cache_lock:
+                self._user_cache.clear()
+            
+            # Schedule a RAG refresh
+            self._refresh_pending.set()
                 
             return f"User {email} deleted successfully"
         else:
-            return f"Failed to delete user {email}"
\ No newline at end of file
+            return f"User with email {email} not found."
+    
+    # Async variants run the pymongo calls on a worker thread so callers on an
+    # event loop can overlap database I/O with other work (e.g. LLM requests)
+    
+    async def acreate_user(self, input_data: CreateUserInput) -> str:
+        """Async version of create_user"""
+        return await asyncio.to_thread(self.create_user, input_data)
+    
+    async def abulk_create_users(self, input_data: BulkCreateUsersInput) -> str:
+        """Async version of bulk_create_users"""
+        return await asyncio.to_thread(self.bulk_create_users, input_data)
+    
+    async def aget_users(self, input_data: Optional[GetUsersInput] = None) -> str:
+        """Async version of get_users"""
+        return await asyncio.to_thread(self.get_users, input_data)
+    
+    async def aupdate_user(self, input_data: UpdateUserInput) -> str:
+        """Async version of update_user"""
+        return await asyncio.to_thread(self.update_user, input_data)
+    
+    async def abulk_update_users(self, input_data: BulkUpdateUsersInput) -> str:
+        """Async version of bulk_update_users"""
+        return await asyncio.to_thread(self.bulk_update_users, input_data)
+    
+    async def adelete_user(self, input_data: DeleteUserInput) -> str:
+        """Async version of delete_user"""
+        return await asyncio.to_thread(self.delete_user, input_data)
\ No newline at end of file
@@ -1,29 +1,132 @@
+import asyncio
 import os
-from typing import Dict, List, Any, Tuple, Optional
+import re
+import uuid
+from typing import Dict, List, Any, Tuple, Optional, AsyncIterator, TypedDict
 from dotenv import load_dotenv
-import json
 from langgraph.graph import StateGraph, END, START
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.schema import HumanMessage, SystemMessage
-from pydantic import BaseModel
+from langchain_core.runnables import RunnableConfig
 
-from src.agent.tools import DatabaseTools, CreateUserInput, UpdateUserInput, DeleteUserInput, GetUsersInput
-from src.rag.retriever import RAGRetriever
+from src.agent.semcache import SemanticCache
+from src.agent.tools import DatabaseTools, CreateUserInput, BulkCreateUsersInput, UpdateUserInput, BulkUpdateUsersInput, DeleteUserInput, GetUsersInput
 from src.rag.processor import RAGProcessor
 
 # Load environment variables
 load_dotenv()
 
-class StateSchema(BaseModel):
+# Tool schemas the classifier can call, mapped to the query type each performs
+_TOOL_SCHEMAS = [CreateUserInput, BulkCreateUsersInput, GetUsersInput, UpdateUserInput, BulkUpdateUsersInput, DeleteUserInput]
+_TOOL_QUERY_TYPES = {
+    CreateUserInput.__name__: "create",
+    BulkCreateUsersInput.__name__: "create",
+    GetUsersInput.__name__: "read",
+    UpdateUserInput.__name__: "update",
+    BulkUpdateUsersInput.__name__: "update",
+    DeleteUserInput.__name__: "delete",
+}
+
+# Structured output schema used to extract parameters for each query type
+_EXTRACTION_SCHEMAS = {
+    "create": BulkCreateUsersInput,
+    "read": GetUsersInput,
+    "update": BulkUpdateUsersInput,
+    "delete": DeleteUserInput,
+}
+
+_CLASSIFIER_SYS_PROMPT = """
+You are a query classifier for a database system. Your task is to determine the type of database operation
+the user wants to perform. Classify the query into one of these categories:
+
+1. CREATE - Creating a new user record
+2. READ - Reading/retrieving user records
+3. UPDATE - Updating an existing user record
+4. DELETE - Deleting a user record
+
+Call the tool matching the operation with the parameters from the query:
+CreateUserInput for one new user, BulkCreateUsersInput for several new users,
+GetUsersInput to read users, UpdateUserInput with the email and the fields to change in data,
+BulkUpdateUsersInput to update several users, and DeleteUserInput with the email.
+
+If the query doesn't contain what the tool needs, don't call a tool. Instead provide your
+classification along with confidence (HIGH, MEDIUM, LOW) and explanation.
+"""
+
+_EXTRACTOR_SYS_PROMPT = """
+You are a tool selection agent for a database system. Based on the user query and the classified query type,
+extract the necessary parameters to execute the appropriate database tool.
+
+For CREATE operations, extract each user's name, email, age (optional) and role (optional)
+For READ operations, extract any filter conditions (or leave them empty for all users)
+For UPDATE operations, extract each user's email (identifier) and the fields to update
+For DELETE operations, extract: email (identifier)
+"""
+
+_RESPONDER_SYS_PROMPT = """
+You are an AI assistant for a database system. Provide a natural, conversational response to the user
+based on their query, the operation performed and its result, given below.
+
+If the operation was successful, summarize what was done.
+If the operation failed or was incomplete, explain what's missing and ask follow-up questions.
+
+Be concise and helpful. Do not invent data that isn't in the result.
+"""
+
+# Separates the static instructions from the per-query part of a system prompt
+_CONTEXT_SEPARATOR = "\n\n"
+
+# Operation named in a free-text classification; word boundaries keep "already" from reading as READ
+_QTYPE_RE = re.compile(r"\b(CREATE|READ|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# Domain labels are dot-separated, so a sentence-ending period isn't taken as part of the address
+_FAST_EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+# Only these whole-query commands skip the LLM classifier; anything longer may qualify or negate them
+_FAST_READ_RE = re.compile(r"\s*(show|get|find)\s+(the\s+)?user\s+(" + _FAST_EMAIL + r")\s*[.!?]?\s*", re.IGNORECASE)
+_FAST_LIST_ALL_RE = re.compile(r"\s*(list|show|get|find)\s+(all\s+)?(the\s+)?users\s*[.!?]?\s*", re.IGNORECASE)
+_FAST_DELETE_RE = re.compile(r"\s*(delete|remove)\s+(the\s+)?user\s+(" + _FAST_EMAIL + r")\s*\.?\s*", re.IGNORECASE)
+
+def _fast_classify(query: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Classify unambiguous queries without calling the LLM
+    
+    A query skips the classifier only when the whole query is one of a few
+    fixed commands, such as "show user <email>". Verbs alone are not enough:
+    "show everyone except <email>" reads the opposite of what its verb and email
+    suggest, so every other query goes to the LLM classifier.
+    
+    Args:
+        query (str): User query
+        
+    Returns:
+        Optional[Tuple[str, Dict]]: Query type and tool arguments, or None if the
+        query is not one of the fixed commands
+    """
+    match = _FAST_DELETE_RE.fullmatch(query)
+    if match:
+        return "delete", {"email": match.group(3)}
+    
+    match = _FAST_READ_RE.fullmatch(query)
+    if match:
+        return "read", {"filters": {"email": match.group(3)}}
+    
+    if _FAST_LIST_ALL_RE.fullmatch(query):
+        return "read", {"filters": {}}
+    return None
+
+class StateSchema(TypedDict, total=False):
+    """Graph state; each node returns only the keys it changes
+    
+    Large per-query data (retrieved context, prompts, tool results) lives in
+    AgentWorkflow._scratch under the request id so the graph never copies it.
+    """
     query: str
-    context: Dict[str, Any]
+    rid: str
+    query_type: str
+    cached: bool
+    read_ok: bool
     response: str
     complete: bool
 
-    class Config:
-        # Allow arbitrary types for context
-        arbitrary_types_allowed = True
-
 class AgentWorkflow:
     """Agent workflow for processing user queries and interacting with the database"""
     
@@ -39,13 +142,13 @@ class AgentWorkflow:
         self.json_path = json_path
         self.config_path = config_path
         
-        # Initialize RAG components
-        self.retriever = RAGRetriever(json_path)
-        self.processor = RAGProcessor(config_path)
-        
         # Initialize database tools
         self.db_tools = DatabaseTools(mongodb_client)
         
+        # Initialize RAG components; the retriever is the one the tools refresh after writes
+        self.retriever = self.db_tools.retriever
+        self.processor = RAGProcessor(config_path)
+        
         # Initialize LLM
         self.llm = ChatGoogleGenerativeAI(
             model="gemini-2.0-flash",
@@ -53,6 +156,19 @@ class AgentWorkflow:
             temperature=0.1
             # Removed deprecated parameter: convert_system_message_to_human
         )
+        # Classifier that returns the operation and its parameters as one tool call
+        self.classifier_llm = self.llm.bind_tools(_TOOL_SCHEMAS, tool_choice="auto")
+        # Parameter extractors constrained to each query type's schema
+        self.extractor_llms = {
+            query_type: self.llm.with_structured_output(schema)
+            for query_type, schema in _EXTRACTION_SCHEMAS.items()
+        }
+        
+        # Per-request working data keyed by request id, kept out of the graph state
+        self._scratch: Dict[str, Dict[str, Any]] = {}
+        
+        # Cache of responses to repeated read queries
+        self._semcache = SemanticCache()
         
         # Create workflow
         self.workflow = self._create_workflow()
@@ -71,26 +187,20 @@ class AgentWorkflow:
         workflow.add_node("tool_selector", self._select_tool)
         workflow.add_node("response_generator", self._generate_response)
         
-        # Define edges
+        # Define edges; reads answered from the cache skip the tool and the response LLM
         workflow.add_edge(START, "query_classifier")
-        workflow.add_edge("query_classifier", "tool_selector")
-        workflow.add_edge("tool_selector", "response_generator")
-        workflow.add_edge("response_generator", END)
-        
-        # Define conditional edges
         workflow.add_conditional_edges(
-            "response_generator",
-            self._check_completion,
-            {
-                True: END,
-                False: "query_classifier"
-            }
+            "query_classifier",
+            lambda state: END if state.get("cached") else "tool_selector",
+            {"tool_selector": "tool_selector", END: END}
         )
+        workflow.add_edge("tool_selector", "response_generator")
+        workflow.add_edge("response_generator", END)
         
-        # Compile the graph to get an executable workflow with invoke()
+        # Compile the graph to get an executable workflow with ainvoke()
         return workflow.compile()
     
-    def _classify_query(self, state: StateSchema) -> Dict[str, Any]:
+    async def _classify_query(self, state: StateSchema) -> Dict[str, Any]:
         """Classify the user query
         
         Args:
@@ -99,69 +209,69 @@ class AgentWorkflow:
         Returns:
             Dict: Updated state
         """
-        query = state.query
-        
-        # Retrieve context from RAG
-        context_items = self.retriever.retrieve_context(query)
-        
-        # Prepare system prompt
-        system_prompt = """
-        You are a query classifier for a database system. Your task is to determine the type of database operation
-        the user wants to perform. Classify the query into one of these categories:
-        
-        1. CREATE - Creating a new user record
-        2. READ - Reading/retrieving user records
-        3. UPDATE - Updating an existing user record
-        4. DELETE - Deleting a user record
-        
-        Provide your classification along with confidence (HIGH, MEDIUM, LOW) and explanation.
-        """
+        query = state["query"]
+        context = self._scratch[state["rid"]]
         
-        # Add context to prompt
-        if context_items:
-            system_prompt += "\n\nHere's some context about the database:\n"
-            system_prompt += json.dumps(context_items, indent=2)
+        # Retrieved once per query in astream_query and reused by every node
+        context_items = context.get("raw_context", [])
         
-        # Get classification from LLM
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=query)
-        ]
-        
-        response = self.llm.invoke(messages)
-        
-        # Extract classification
-        classification_text = response.content
-        
-        # Simple parsing of classification
-        query_type = ""
-        if "CREATE" in classification_text.upper():
-            query_type = "create"
-        elif "READ" in classification_text.upper():
-            query_type = "read"
-        elif "UPDATE" in classification_text.upper():
-            query_type = "update"
-        elif "DELETE" in classification_text.upper():
-            query_type = "delete"
+        # Fixed whole-query commands are classified by pattern, skipping the LLM round trip
+        fast = _fast_classify(query)
+        if fast is not None:
+            query_type, tool_args = fast
+            classification_text = f"{query_type.upper()} (HIGH): matched by pattern"
         else:
-            # Default to read if unclear
-            query_type = "read"
+            # Static instructions first so the prompt prefix is identical across turns
+            system_prompt = _CLASSIFIER_SYS_PROMPT
+            
+            # Add a compact, bounded summary of the context instead of the raw items
+            if context_items:
+                summary = self.processor.format_for_query(context_items, "read")
+                system_prompt += _CONTEXT_SEPARATOR + "Here's some context about the database:\n" + summary
+            
+            # Get classification from LLM
+            messages = [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=query)
+            ]
+            
+            response = await self.classifier_llm.ainvoke(messages)
             
+            # Extract classification
+            classification_text = response.content
+            
+            # A tool call carries both the operation and its parameters
+            tool_call = response.tool_calls[0] if response.tool_calls else None
+            tool_args = None
+            
+            if tool_call and tool_call["name"] in _TOOL_QUERY_TYPES:
+                query_type = _TOOL_QUERY_TYPES[tool_call["name"]]
+                tool_args = tool_call["args"]
+            else:
+                # Simple parsing of classification in one pass; default to read if unclear
+                match = _QTYPE_RE.search(classification_text)
+                query_type = match.group(1).lower() if match else "read"
+        
+        # Near-duplicates are looked up only once the query is known to be a read,
+        # so a write is never answered from the cache
+        if query_type == "read":
+            cached = self._semcache.query(context["minhash"], query)
+            if cached is not None:
+                return {"query_type": query_type, "cached": True, "response": cached, "complete": True}
+                
         # Process context
-        processed_context = self.processor.process_context(context_items, query_type)
-        formatted_context = self.processor.format_for_prompt(processed_context)
+        formatted_context = self.processor.format_for_query(context_items, query_type)
         
-        # Update context on the state
-        state.context = {
+        context.update({
             "query_type": query_type,
             "classification": classification_text,
-            "formatted_context": formatted_context,
-            "raw_context": context_items
-        }
-        # Return updated state dict for graph
-        return state.dict()
+            "tool_args": tool_args,
+            "formatted_context": formatted_context
+        })
+        # Only the small routing fields go through the graph state
+        return {"query_type": query_type}
     
-    def _select_tool(self, state: StateSchema) -> Dict[str, Any]:
+    async def _select_tool(self, state: StateSchema) -> Dict[str, Any]:
         """Select and execute the appropriate tool
         
         Args:
@@ -170,138 +280,149 @@ class AgentWorkflow:
         Returns:
             Dict: Updated state
         """
-        query = state.query
-        context = state.context
+        query = state["query"]
+        context = self._scratch[state["rid"]]
         query_type = context["query_type"]
         formatted_context = context["formatted_context"]
         
-        # Check if tool has already been executed for this query
-        if "tool_result" in context and context["tool_result"]:
-            # Tool already executed, just return the current state
-            return state.dict()
-        
-        # Prepare system prompt
-        system_prompt = f"""
-        You are a tool selection agent for a database system. Based on the user query and the classified query type,
-        extract the necessary parameters to execute the appropriate database tool.
-        
-        Query type: {query_type}
-        
-        {formatted_context}
+        # Set only once the database has answered a read, even with no matching users
+        context["read_ok"] = False
         
-        For CREATE operations, extract: name, email, age (optional), role (optional)
-        For READ operations, extract any filter conditions (or return empty for all users)
-        For UPDATE operations, extract: email (identifier) and the fields to update
-        For DELETE operations, extract: email (identifier)
-        
-        Return ONLY the extracted parameters in JSON format.
-        """
-        
-        # Get parameters from LLM
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=query)
-        ]
-        
-        response = self.llm.invoke(messages)
-        
-        # Try to parse JSON response
+        # Try to get parameters and execute the tool
         try:
-            # Extract JSON from the response
-            response_text = response.content
+            parameters = context.get("tool_args")
             
-            # Find JSON in the response
-            json_start = response_text.find("{")
-            json_end = response_text.rfind("}") + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                parameters = json.loads(json_str)
-            else:
-                parameters = {}
+            # Extract parameters with a separate LLM call only if classification didn't provide them
+            if parameters is None:
+                parameters = await self._extract_parameters(query, query_type, formatted_context)
                 
-            # Execute appropriate tool based on query type
+            # Execute appropriate tool based on query type; pymongo runs on a worker thread so the loop stays free
             result = ""
             
-            # Check if the same tool has already been executed for this query by looking at past results
-            tool_already_executed = False
-            if 'tool_result' in state.context:
-                # Don't execute the same tool multiple times
-                tool_already_executed = True
-                result = state.context["tool_result"]
-                
-            if not tool_already_executed:
-                if query_type == "create":
-                    # Prepare input for create tool
-                    create_input = CreateUserInput(
-                        name=parameters.get("name", ""),
-                        email=parameters.get("email", ""),
-                        age=parameters.get("age"),
-                        role=parameters.get("role")
+            if query_type == "create" and isinstance(parameters.get("users"), list):
+                # Prepare input for bulk create tool
+                bulk_input = BulkCreateUsersInput(users=[
+                    CreateUserInput(
+                        name=user.get("name", ""),
+                        email=user.get("email", ""),
+                        age=user.get("age"),
+                        role=user.get("role")
                     )
-                    result = self.db_tools.create_user(create_input)
-                    
-                elif query_type == "read":
-                    # Prepare input for get tool
-                    filters = parameters.get("filters", {})
-                    get_input = GetUsersInput(filters=filters)
-                    result = self.db_tools.get_users(get_input)
-                    
-                elif query_type == "update":
-                    # Prepare input for update tool
-                    email = parameters.get("email", "")
-                    # Remove email from update data
+                    for user in parameters["users"]
+                ])
+                result = await self.db_tools.abulk_create_users(bulk_input)
+                
+            elif query_type == "create":
+                # Prepare input for create tool
+                create_input = CreateUserInput(
+                    name=parameters.get("name", ""),
+                    email=parameters.get("email", ""),
+                    age=parameters.get("age"),
+                    role=parameters.get("role")
+                )
+                result = await self.db_tools.acreate_user(create_input)
+                
+            elif query_type == "read":
+                # Prepare input for get tool
+                filters = parameters.get("filters", {})
+                get_input = GetUsersInput(filters=filters)
+                result = await self.db_tools.aget_users(get_input)
+                context["read_ok"] = True
+                
+            elif query_type == "update" and isinstance(parameters.get("updates"), list):
+                # Prepare input for bulk update tool
+                bulk_input = BulkUpdateUsersInput(updates=[
+                    UpdateUserInput(email=update.get("email", ""), data=update.get("data") or {})
+                    for update in parameters["updates"]
+                ])
+                result = await self.db_tools.abulk_update_users(bulk_input)
+                
+            elif query_type == "update":
+                # Prepare input for update tool
+                email = parameters.get("email", "")
+                # Tool calls nest the fields under data; extracted JSON has them alongside email
+                if isinstance(parameters.get("data"), dict):
+                    update_data = parameters["data"]
+                else:
                     update_data = {k: v for k, v in parameters.items() if k != "email"}
-                    update_input = UpdateUserInput(email=email, data=update_data)
-                    result = self.db_tools.update_user(update_input)
-                    
-                elif query_type == "delete":
-                    # Prepare input for delete tool
-                    email = parameters.get("email", "")
-                    delete_input = DeleteUserInput(email=email)
-                    result = self.db_tools.delete_user(delete_input)
+                update_input = UpdateUserInput(email=email, data=update_data)
+                result = await self.db_tools.aupdate_user(update_input)
+                
+            elif query_type == "delete":
+                # Prepare input for delete tool
+                email = parameters.get("email", "")
+                delete_input = DeleteUserInput(email=email)
+                result = await self.db_tools.adelete_user(delete_input)
             
-            # Update state context with tool execution results
-            state.context["tool_result"] = result if 'result' in locals() else None
-            state.context["parameters"] = parameters if 'parameters' in locals() else {}
-            # Return updated state dict
-            return state.dict()
+            # Update context with tool execution results
+            context["tool_result"] = result
+            context["parameters"] = parameters
         
         except Exception as e:
             # Handle parsing errors
-            state.context["tool_result"] = f"Error executing tool: {str(e)}"
-            state.context["parameters"] = {}
-            # Return updated state dict
-            return state.dict()
+            context["tool_result"] = f"Error executing tool: {str(e)}"
+            context["parameters"] = {}
+        
+        # Results stay in the scratch data; the state only records whether a read succeeded
+        return {"read_ok": context["read_ok"]}
+    
+    async def _extract_parameters(self, query: str, query_type: str, formatted_context: str) -> Dict[str, Any]:
+        """Extract tool parameters from the query with the LLM
+        
+        Args:
+            query (str): User query
+            query_type (str): Classified query type
+            formatted_context (str): Database context for the prompt
+            
+        Returns:
+            Dict: Extracted parameters
+        """
+        # Static instructions first so Gemini can reuse the cached prompt prefix
+        system_prompt = _EXTRACTOR_SYS_PROMPT + _CONTEXT_SEPARATOR + f"Query type: {query_type}\n\n{formatted_context}"
+        
+        extractor = self.extractor_llms.get(query_type)
+        if extractor is None:
+            return {}
+        
+        # Get parameters from LLM as an instance of the schema
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=query)
+        ]
+        
+        result = await extractor.ainvoke(messages)
+        if result is None:
+            return {}
+        parameters = result.model_dump(exclude_none=True)
+        
+        # A batch of one is handled by the single user tools
+        for key in ("users", "updates"):
+            if len(parameters.get(key, [])) == 1:
+                return parameters[key][0]
+        return parameters
     
-    def _generate_response(self, state: StateSchema) -> Dict[str, Any]:
+    async def _generate_response(self, state: StateSchema, config: RunnableConfig) -> Dict[str, Any]:
         """Generate a response to the user
         
         Args:
             state: Current state
+            config: Run config, passed to the LLM so its tokens reach the graph stream
             
         Returns:
             Dict: Updated state
         """
-        query = state.query
-        context = state.context
+        query = state["query"]
+        context = self._scratch[state["rid"]]
         query_type = context.get("query_type", "")
         tool_result = context.get("tool_result", "")
         parameters = context.get("parameters", {})
         
-        # Prepare system prompt
-        system_prompt = f"""
-        You are an AI assistant for a database system. Provide a natural, conversational response to the user based on:
-        
-        1. Their original query: "{query}"
-        2. The operation performed: {query_type}
-        3. The result: {tool_result}
-        
-        If the operation was successful, summarize what was done.
-        If the operation failed or was incomplete, explain what's missing and ask follow-up questions.
-        
-        Be concise and helpful. Do not invent data that isn't in the result.
-        """
+        # Static instructions first so Gemini can reuse the cached prompt prefix
+        system_prompt = _RESPONDER_SYS_PROMPT + _CONTEXT_SEPARATOR + (
+            f'1. Their original query: "{query}"\n'
+            f"2. The operation performed: {query_type}\n"
+            f"3. The result: {tool_result}"
+        )
         
         # Get response from LLM
         messages = [
@@ -309,7 +430,7 @@ class AgentWorkflow:
             HumanMessage(content=query)
         ]
         
-        response = self.llm.invoke(messages)
+        response = await self.llm.ainvoke(messages, config=config)
         
         # Check if the operation was successful based on tool_result
         operation_successful = "successfully" in tool_result.lower() if tool_result else False
@@ -318,9 +439,9 @@ class AgentWorkflow:
         complete = True
         
         # If required parameters are missing, mark as incomplete
-        if query_type == "create" and (not parameters.get("name") or not parameters.get("email")):
+        if query_type == "create" and not parameters.get("users") and (not parameters.get("name") or not parameters.get("email")):
             complete = False
-        elif query_type == "update" and (not parameters.get("email") or len(parameters) <= 1):
+        elif query_type == "update" and not parameters.get("updates") and (not parameters.get("email") or len(parameters) <= 1):
             complete = False
         elif query_type == "delete" and not parameters.get("email"):
             complete = False
@@ -330,24 +451,60 @@ class AgentWorkflow:
             # Operation was attempted but failed - no need to retry
             complete = True
             
-        # Update state with response and completion flag
-        state.response = response.content
-        state.complete = complete
-        # Return updated state dict
-        return state.dict()
+        # Return the response and completion flag
+        return {"response": response.content, "complete": complete}
     
-    def _check_completion(self, state: StateSchema) -> bool:
-        """Check if the interaction is complete
+    async def astream_query(self, query: str) -> AsyncIterator[str]:
+        """Process a user query through the workflow, streaming the response
         
         Args:
-            state: Current state
+            query (str): User query
             
-        Returns:
-            bool: True if complete, False otherwise
+        Yields:
+            str: Chunks of the response to the user as they arrive
         """
-        return state.complete
+        rid = uuid.uuid4().hex
+        try:
+            # The classifier looks up near-duplicates of recent read queries with this signature
+            mh = self._semcache.minhash(query)
+            
+            # Retrieve context once up front; the nodes read it from the scratch data
+            self._scratch[rid] = {"raw_context": await self.retriever.aretrieve_context(query), "minhash": mh}
+            
+            # Initialize state
+            state = {"query": query, "rid": rid}
+            
+            # Run workflow, forwarding tokens of the final response as they are generated
+            result = state
+            streamed = False
+            async for mode, chunk in self.workflow.astream(state, stream_mode=["messages", "values"]):
+                if mode == "values":
+                    result = chunk
+                    continue
+                
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "response_generator" and isinstance(message.content, str) and message.content:
+                    streamed = True
+                    yield message.content
+            
+            # Fall back to the full response if the model didn't stream, or it came from the cache
+            if not streamed:
+                yield result.get("response", "")
+            
+            # Only reads the database answered are safe to replay, and any write may change what they return
+            if result.get("query_type") == "read":
+                if result.get("read_ok"):
+                    self._semcache.insert(mh, query, result.get("response", ""))
+            else:
+                self._semcache.clear()
+        except Exception as e:
+            # Handle any unexpected errors
+            print(f"Error processing query: {e}")
+            yield f"I'm sorry, I encountered an error while processing your request. Please try again with a more specific query."
+        finally:
+            self._scratch.pop(rid, None)
     
-    def process_query(self, query: str) -> str:
+    async def aprocess_query(self, query: str) -> str:
         """Process a user query through the workflow
         
         Args:
@@ -356,15 +513,16 @@ class AgentWorkflow:
         Returns:
             str: Response to the user
         """
-        try:
-            # Initialize state
-            state = {"query": query, "context": {}, "response": "", "complete": False}
+        return "".join([chunk async for chunk in self.astream_query(query)])
+    
+    def process_query(self, query: str) -> str:
+        """Process a user query through the workflow from synchronous code
+        
+        Args:
+            query (str): User query
             
-            # Run workflow
-            result = self.workflow.invoke(state)
-            # Return the 'response' from the result mapping
-            return result["response"]
-        except Exception as e:
-            # Handle any unexpected errors
-            print(f"Error processing query: {e}")
-            return f"I'm sorry, I encountered an error while processing your request. Please try again with a more specific query."
\ No newline at end of file
+        Returns:
+            str: Response to the user
+        """
+        # A fresh loop per call, closed when the query completes; async callers use aprocess_query
+        return asyncio.run(self.aprocess_query(query))
\ No newline at end of file
@@ -1,5 +1,12 @@
-import sys
+import asyncio
 import os
+import orjson
+from prompt_toolkit import PromptSession
+from prompt_toolkit.history import FileHistory
+from prompt_toolkit.patch_stdout import patch_stdout
+
+# Sentinel queued when the user asks to leave
+_EXIT = object()
 
 class TerminalInterface:
     """Terminal interface for interacting with the agent"""
@@ -21,27 +28,70 @@ class TerminalInterface:
         
     def start_chat(self):
         """Start the chat interface"""
+        asyncio.run(self.astart_chat())
+        
+    async def astart_chat(self):
+        """Run the chat loop, streaming agent responses line by line as they are generated
+        
+        Input is read by a separate task, so the next query can be typed while
+        the previous response is still streaming. Queries are answered in order.
+        """
         self.display_welcome()
         
+        # History persists across sessions and is searchable with the arrow keys / Ctrl-R
+        session = PromptSession(history=FileHistory(".chat_history"))
+        queries = asyncio.Queue()
+        
+        # Keep the prompt pinned below the agent's output
+        with patch_stdout():
+            reader = asyncio.create_task(self._read_queries(session, queries))
+            try:
+                while True:
+                    user_input = await queries.get()
+                    
+                    # Check for exit command
+                    if user_input is _EXIT:
+                        print("\nGoodbye!")
+                        break
+                    
+                    # Process query through agent
+                    try:
+                        print("\nProcessing...")
+                        
+                        # Display response line by line; the prompt redraw would overwrite a partial line
+                        print()
+                        pending = "Agent: "
+                        async for chunk in self.agent.astream_query(user_input):
+                            lines, newline, pending = (pending + chunk).rpartition("\n")
+                            if newline:
+                                print(lines)
+                        print(pending)
+                        
+                    except Exception as e:
+                        print(f"\nError: {str(e)}")
+            finally:
+                reader.cancel()
+    
+    async def _read_queries(self, session, queries):
+        """Read user input into the queue until the user exits
+        
+        Args:
+            session: Prompt session to read from
+            queries: Queue the agent loop consumes
+        """
         while True:
-            # Get user input
-            user_input = input("\nYou: ")
+            try:
+                user_input = await session.prompt_async("\nYou: ")
+            except (EOFError, KeyboardInterrupt):
+                user_input = "q"
             
-            # Check for exit command
             if user_input.lower() == "q":
-                print("\nGoodbye!")
-                break
-                
-            # Process query through agent
-            try:
-                print("\nProcessing...")
-                response = self.agent.process_query(user_input)
-                
-                # Display response
-                print("\nAgent:", response)
-                
-            except Exception as e:
-                print(f"\nError: {str(e)}")
+                await queries.put(_EXIT)
+                return
+            
+            # Ignore empty lines
+            if user_input.strip():
+                await queries.put(user_input)
                 
     def format_json_output(self, json_data):
         """Format JSON data for terminal display
@@ -52,17 +102,15 @@ class TerminalInterface:
         Returns:
             str: Formatted string
         """
-        import json
-        
         try:
             if isinstance(json_data, str):
                 # Try to parse JSON string
-                data = json.loads(json_data)
+                data = orjson.loads(json_data)
             else:
                 data = json_data
                 
             # Pretty print with indentation
-            return json.dumps(data, indent=2)
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2, default=str).decode()
             
         except Exception:
             # If not valid JSON, return as is
@@ -1,10 +1,23 @@
 import os
+import atexit
+import threading
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError, DuplicateKeyError, OperationFailure, BulkWriteError
 
 load_dotenv()
 
+# Fields every user document must provide
+_REQUIRED_USER_FIELDS = ("email", "name", "role", "age")
+
+# Default fields returned for users, without the internal _id
+_USER_PROJECTION = {"_id": 0, "name": 1, "email": 1, "age": 1, "role": 1}
+
+# One pooled client per URI shared by every MongoDB instance, and the URIs already pinged
+_CLIENTS = {}
+_PINGED = set()
+_CLIENTS_LOCK = threading.Lock()
+
 class MongoDB:
     """MongoDB Database Connection Class."""
     
@@ -13,29 +26,127 @@ class MongoDB:
         self.uri = os.getenv("MONGODB_URI")
         self.client = None
         self.db = None
+        # In-process email index kept in sync by a change stream; None when unavailable
+        self._emails_by_id = None
+        self._emails = set()
+        self._emails_lock = threading.Lock()
+        self._email_stream = None
         
     def connect(self):
         """Connect to MongoDB."""
         try:
-            self.client = MongoClient(self.uri, serverSelectionTimeoutMS=5000)
+            with _CLIENTS_LOCK:
+                if self.uri not in _CLIENTS:
+                    # Keep a warm pool so tool calls don't pay for new TCP/TLS handshakes
+                    _CLIENTS[self.uri] = MongoClient(
+                        self.uri,
+                        serverSelectionTimeoutMS=5000,
+                        maxPoolSize=200,
+                        minPoolSize=10,
+                        maxIdleTimeMS=300000,
+                        retryWrites=True,
+                        # Compressors are negotiated in order; snappy and zstd come from the pymongo extras, zlib is always available
+                        compressors="zstd,snappy,zlib"
+                    )
+                self.client = _CLIENTS[self.uri]
             
-            #Test the Connection
-            self.client.admin.command('ping')
+            #Test the Connection, once per shared client
+            if self.uri not in _PINGED:
+                self.client.admin.command('ping')
+                _PINGED.add(self.uri)
             self.db = self.client["chat-tool"]
             print("MongoDB connection established.")
-            return True
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             print(f"MongoDB connection error: {e}")
             return False
         
+        # Enforce unique emails on the server so writes don't need a pre-check
+        try:
+            self.db["users"].create_index("email", unique=True)
+        except OperationFailure as e:
+            print(f"Warning: Could not create unique index on users.email: {e}")
+        
+        self._start_email_index()
+        return True
+    
+    def _start_email_index(self):
+        """Bootstrap the in-process email index and keep it in sync with a change stream"""
+        collection = self.db["users"]
+        try:
+            # Open the stream before bootstrapping so no change in between is missed
+            stream = collection.watch(
+                [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}],
+                full_document="updateLookup"
+            )
+        except OperationFailure as e:
+            # Change streams need a replica set; user_exists falls back to querying
+            print(f"Change streams unavailable, email lookups will query MongoDB: {e}")
+            return
+        
+        emails_by_id = {doc["_id"]: doc.get("email") for doc in collection.find({}, {"email": 1})}
+        with self._emails_lock:
+            self._emails_by_id = emails_by_id
+            self._emails = {email for email in emails_by_id.values() if email}
+        
+        self._email_stream = stream
+        threading.Thread(target=self._watch_emails, args=(stream,), daemon=True).start()
+    
+    def _watch_emails(self, stream):
+        """Apply user changes from the change stream to the email index"""
+        try:
+            for change in stream:
+                doc_id = change["documentKey"]["_id"]
+                with self._emails_lock:
+                    self._emails.discard(self._emails_by_id.pop(doc_id, None))
+                    if change["operationType"] != "delete":
+                        email = (change.get("fullDocument") or {}).get("email")
+                        if email:
+                            self._emails_by_id[doc_id] = email
+                            self._emails.add(email)
+        except Exception as e:
+            if self._email_stream is not None:
+                print(f"Email change stream stopped: {e}")
+        finally:
+            # Without the stream the index can go stale, so stop using it
+            with self._emails_lock:
+                self._emails_by_id = None
+                self._emails = set()
+    
+        
+    
+    def get_topology_description(self):
+        """Get the client's topology description for pool monitoring
+        
+        Returns:
+            TopologyDescription : Current topology of the connected deployment or None if not connected.
+        """
+        if self.client is None:
+            return None
+        return self.client.topology_description
     
     def close(self):
-        """Close MongoDB connection."""
+        """Close MongoDB connection.
+        
+        The pooled client is shared with other instances and stays open until shutdown().
+        """
+        if self._email_stream is not None:
+            stream, self._email_stream = self._email_stream, None
+            stream.close()
         if self.client:
-            self.client.close()
+            self.client = None
+            self.db = None
             print("MongoDB connection closed.")
         else:
             print("No MongoDB connection to close.")
+    
+    @staticmethod
+    def shutdown():
+        """Close every shared MongoDB client. Registered to run at interpreter exit."""
+        with _CLIENTS_LOCK:
+            for client in _CLIENTS.values():
+                client.close()
+            _CLIENTS.clear()
+            _PINGED.clear()
 
 
     def create_user(self, user_data):
@@ -46,6 +157,9 @@ class MongoDB:
             
         Returns:
             str : The ID of the inserted user or None if the insertion failed.
+            
+        Raises:
+            DuplicateKeyError: If a user with the same email already exists.
         """
         
         try:
@@ -56,53 +170,119 @@ class MongoDB:
             collection = self.db["users"]
 
             # Check if all the Data has been provided
-            if not all(key in user_data for key in ["email", "name", "role", "age"]):
+            if not all(key in user_data for key in _REQUIRED_USER_FIELDS):
                 print("Missing required user data")
                 return None
             
-            # Check if user with the same email already exists
-            existing_user = collection.find_one({"email": user_data.get("email")})
-            if existing_user:
-                print(f"User with email {user_data.get('email')} already exists")
-                return None
-                
-            result = collection.insert_one(user_data)
-            return str(result.inserted_id)
+            # Insert-if-absent as a single atomic server-side operation
+            email = user_data.get("email")
+            result = collection.update_one({"email": email}, {"$setOnInsert": user_data}, upsert=True)
+            if result.upserted_id is None:
+                raise DuplicateKeyError(f"User with email {email} already exists", code=11000)
+            return str(result.upserted_id)
 
+        except DuplicateKeyError:
+            raise
         except Exception as e:
             print(f"Error creating user: {e}")
             return None
         
         
         
-    def get_users(self, query=None):
+    def create_users_bulk(self, users):
+        """Create multiple Users in the MongoDB Database in one round trip
+        
+        Args:
+            users (list): List of user data dicts to be inserted into the database.
+            
+        Returns:
+            list : IDs of the inserted users. Users with missing data or an existing email are skipped.
+        """
+        
+        try:
+            if self.db is None:
+                print("MongoDB not connected")
+                return []
+                
+            collection = self.db["users"]
+            
+            # Check if all the Data has been provided for each user
+            docs = [user for user in users if all(key in user for key in _REQUIRED_USER_FIELDS)]
+            if len(docs) < len(users):
+                print(f"Skipping {len(users) - len(docs)} users with missing required data")
+            if not docs:
+                return []
+            
+            # Unordered so one duplicate email doesn't stop the rest of the batch
+            try:
+                result = collection.insert_many(docs, ordered=False)
+                return [str(inserted_id) for inserted_id in result.inserted_ids]
+            except BulkWriteError as e:
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                print(f"Skipping {len(failed)} users that could not be inserted")
+                # insert_many assigns an _id to every document before sending
+                return [str(doc["_id"]) for i, doc in enumerate(docs) if i not in failed]
+
+        except Exception as e:
+            print(f"Error creating users: {e}")
+            return []
+        
+    def get_users(self, query=None, projection=None):
         """Get Users from the MongoDB Database
         
         Args:
             query (dict, optional): Query to filter users. Defaults to None.
+            projection (dict, optional): Fields to return. Defaults to the user fields without _id.
             
         Returns:
-            list : List of users matching the query or all users if no query is provided.
+            list : List of users matching the query or all users if no query is provided,
+                or None if the query failed.
         """
         
         try:
             if self.db is None:
                 print("MongoDB not connected")
-                return []
+                return None
                 
             collection = self.db["users"]
-            if query:
-                # Exclude the _id field from the results
-                return list(collection.find(query, {"_id": 0}))
-            else:
-                return list(collection.find({}, {"_id": 0}))
+            # Only ask the server for the fields we use
+            return list(collection.find(query or {}, projection or _USER_PROJECTION))
 
         except Exception as e:
             print(f"Error getting users: {e}")
-            return []
+            return None
                 
                 
                 
+    def user_exists(self, email):
+        """Check if a User exists in the MongoDB Database
+        
+        Args:
+            email (str): Email of the user to look up.
+            
+        Returns:
+            bool : True if a user with the email exists, False otherwise.
+            
+        Uses the in-process email index when the change stream is running and
+        falls back to a count query otherwise.
+        """
+        
+        with self._emails_lock:
+            if self._emails_by_id is not None:
+                return email in self._emails
+        
+        try:
+            if self.db is None:
+                print("MongoDB not connected")
+                return False
+                
+            # Stops at the first match (served by the email index) without returning the document
+            return self.db["users"].count_documents({"email": email}, limit=1) > 0
+
+        except Exception as e:
+            print(f"Error checking user: {e}")
+            return False
+                
     def update_user(self, email, update_data):
         """Update User in the MongoDB Database
         
@@ -111,7 +291,10 @@ class MongoDB:
             update_data (dict): Data to update the user with.
             
         Returns:
-            bool : True if the update was successful, False otherwise.
+            bool : True if a user with the email was found and updated, False otherwise.
+            
+        Raises:
+            DuplicateKeyError: If the update changes the email to one another user already has.
         """
         
         try:
@@ -122,12 +305,48 @@ class MongoDB:
             collection = self.db["users"]
             result = collection.update_one({"email": email}, {"$set": update_data})
             
-            return result.modified_count > 0
+            return result.matched_count > 0
 
+        except DuplicateKeyError:
+            raise
         except Exception as e:
             print(f"Error updating user: {e}")
             return False
         
+    def update_users_bulk(self, updates):
+        """Update multiple Users in the MongoDB Database in one round trip
+        
+        Args:
+            updates (list): List of (email, update_data) pairs.
+            
+        Returns:
+            int : Number of users that were found and updated.
+        """
+        
+        try:
+            if self.db is None:
+                print("MongoDB not connected")
+                return 0
+                
+            collection = self.db["users"]
+            
+            # MongoDB rejects an empty $set, so skip updates without data
+            operations = [UpdateOne({"email": email}, {"$set": update_data}) for email, update_data in updates if update_data]
+            if not operations:
+                return 0
+            
+            # Unordered so one failed update doesn't stop the rest of the batch
+            try:
+                result = collection.bulk_write(operations, ordered=False)
+                return result.matched_count
+            except BulkWriteError as e:
+                print(f"Skipping {len(e.details.get('writeErrors', []))} users that could not be updated")
+                return e.details.get("nMatched", 0)
+
+        except Exception as e:
+            print(f"Error updating users: {e}")
+            return 0
+        
     def delete_user(self, email):
         """Delete User from the MongoDB Database
         
@@ -151,3 +370,5 @@ class MongoDB:
         except Exception as e:
             print(f"Error deleting user: {e}")
             return False
+
+atexit.register(MongoDB.shutdown)
@@ -1,5 +1,8 @@
 import json
+import hashlib
+import orjson
 import os
+from cachetools import LRUCache
 
 class RAGProcessor:
     """Pricess the Context Query and Format it for the Agent for Apt response"""
@@ -13,6 +16,27 @@ class RAGProcessor:
         self.config_path = config_path
         self.config = self.load_config()
         
+        # Field lists and prompt text only depend on the config, so build them once
+        fields = tuple(self.config.get("collections", {}).get("users", {}).get("fields", []))
+        self._available = fields
+        self._optional = tuple(f for f in fields if f not in ("name", "email"))
+        self._updateable = tuple(f for f in fields if f != "email")
+        
+        self._type_context = {
+            "create": {"required_fields": ("name", "email"), "optional_fields": self._optional},
+            "update": {"identifiers": ("email",), "updateable_fields": self._updateable},
+            "delete": {"identifiers": ("email",)},
+        }
+        self._header = f"--- DATABASE CONTEXT ---\nAvailable fields: {', '.join(self._available)}\n"
+        self._type_prompts = {
+            "create": f"Required fields: name, email\nOptional fields: {', '.join(self._optional)}\n",
+            "update": f"Identifier fields: email\nUpdateable fields: {', '.join(self._updateable)}\n",
+            "delete": "Identifier fields: email\n",
+        }
+        
+        # Formatted prompt context keyed by (query type, context fingerprint)
+        self._formatted = LRUCache(maxsize=256)
+        
     def load_config(self):
         """Load configuration from config file
         
@@ -41,24 +65,13 @@ class RAGProcessor:
             dict: Processed context with relevant information
         """
         processed = {
-            "available_fields": self.config.get("collections", {}).get("users", {}).get("fields", []),
+            "available_fields": self._available,
             "relevant_data": context,
             "query_type": query_type
         }
         
-        # Add specific context based on query type
-        if query_type.lower() == "create":
-            processed["required_fields"] = ["name", "email"]
-            processed["optional_fields"] = [f for f in processed["available_fields"] if f not in ["name", "email"]]
-            
-        elif query_type.lower() == "update":
-            processed["identifiers"] = ["email"]
-            processed["updateable_fields"] = [f for f in processed["available_fields"] if f not in ["email"]]
-            
-        elif query_type.lower() == "delete":
-            processed["identifiers"] = ["email"]
-            
-        # For read, no additional processing needed
+        # Add specific context based on query type; read needs no additional processing
+        processed.update(self._type_context.get(query_type.lower(), {}))
             
         return processed
     
@@ -71,31 +84,37 @@ class RAGProcessor:
         Returns:
             str: Formatted context string for prompt
         """
-        context_str = "--- DATABASE CONTEXT ---\n"
-        
-        # Add available fields
-        fields = processed_context.get("available_fields", [])
-        context_str += f"Available fields: {', '.join(fields)}\n"
-        
-        # Add query type specific information
+        # Start from the precomputed field and query type specific information
         query_type = processed_context.get("query_type", "").lower()
-        
-        if query_type == "create":
-            context_str += f"Required fields: {', '.join(processed_context.get('required_fields', []))}\n"
-            context_str += f"Optional fields: {', '.join(processed_context.get('optional_fields', []))}\n"
-            
-        elif query_type == "update":
-            context_str += f"Identifier fields: {', '.join(processed_context.get('identifiers', []))}\n"
-            context_str += f"Updateable fields: {', '.join(processed_context.get('updateable_fields', []))}\n"
-            
-        elif query_type == "delete":
-            context_str += f"Identifier fields: {', '.join(processed_context.get('identifiers', []))}\n"
+        parts = [self._header, self._type_prompts.get(query_type, "")]
         
         # Add sample data if available
         relevant_data = processed_context.get("relevant_data", [])
         if relevant_data:
-            context_str += "\nSample data:\n"
+            parts.append("\nSample data:\n")
             for i, item in enumerate(relevant_data[:2]):  # Limit to 2 samples
-                context_str += f"Sample {i+1}: {json.dumps(item, indent=2)}\n"
+                parts.append(f"Sample {i+1}: {orjson.dumps(item, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS, default=str).decode()}\n")
+        
+        return "".join(parts)
+    
+    def format_for_query(self, context, query_type):
+        """Process and format context for a query type, memoized on the context contents
+        
+        Args:
+            context (list): List of context items
+            query_type (str): Type of query (create, read, update, delete)
+            
+        Returns:
+            str: Formatted context string for prompt
+        """
+        fingerprint = hashlib.blake2b(
+            orjson.dumps(context, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str),
+            digest_size=16
+        ).digest()
+        key = (query_type, fingerprint)
         
-        return context_str
\ No newline at end of file
+        formatted = self._formatted.get(key)
+        if formatted is None:
+            formatted = self.format_for_prompt(self.process_context(context, query_type))
+            self._formatted[key] = formatted
+        return formatted
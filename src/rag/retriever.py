@@ -1,8 +1,34 @@
 import os
-import json
+import asyncio
+import hashlib
+import orjson
 from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from elasticsearch.helpers import streaming_bulk
 import time
+import threading
+from functools import lru_cache
+from cachetools import LRUCache
+
+# Bulk indexing batches: up to this many documents or bytes per request, whichever comes first
+_INDEX_CHUNK_SIZE = 1000
+_INDEX_CHUNK_BYTES = 10 * 1024 * 1024
+
+@lru_cache(maxsize=4)
+def _get_es_client(es_host):
+    """Get the Elasticsearch client for a host, shared by every retriever
+    
+    Args:
+        es_host (str): Elasticsearch host URL.
+        
+    Returns:
+        Elasticsearch: Client with its own connection pool.
+    """
+    # Fix Elasticsearch client to specify API version compatibility
+    return Elasticsearch(
+        es_host, 
+        request_timeout=30,
+        headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=8"}
+    )
 
 class RAGRetriever:
     """Retriever Class that uses Elasticsearch for efficient text retrieval with built-in embedding generation"""
@@ -16,12 +42,7 @@ class RAGRetriever:
         """
         self.json_path = json_path
         try:
-            # Fix Elasticsearch client to specify API version compatibility
-            self.es_client = Elasticsearch(
-                es_host, 
-                request_timeout=30,
-                headers={"Accept": "application/vnd.elasticsearch+json; compatible-with=8"}
-            )
+            self.es_client = _get_es_client(es_host)
             self.es_available = True
         except Exception as e:
             print(f"Error connecting to Elasticsearch: {e}")
@@ -29,6 +50,14 @@ class RAGRetriever:
             
         self.index_name = "user_data"
         self.json_data = None
+        # Modification time of the JSON file when it was last loaded
+        self._mtime = None
+        # Digest of the loaded file contents, and of the contents last indexed into Elasticsearch
+        self._data_hash = None
+        self._indexed_hash = None
+        # Memoized searches keyed on the normalized query; cleared whenever the data is refreshed
+        self._search_cache = LRUCache(maxsize=10000)
+        self._search_cache_lock = threading.Lock()
         self.load_data()
         
         # Only set up Elasticsearch if it's available
@@ -41,17 +70,20 @@ class RAGRetriever:
     
     def load_data(self):
         """Load Data from the JSON file."""
+        self._mtime = self._file_mtime()
+        self._data_hash = None
         try:
             if os.path.exists(self.json_path) and os.path.getsize(self.json_path) > 0:
-                with open(self.json_path, 'r') as f:
-                    data = json.load(f)
+                with open(self.json_path, 'rb') as f:
+                    raw = f.read()
+                data = orjson.loads(raw)
+                self._data_hash = hashlib.blake2b(raw, digest_size=16).digest()
                     
-                # Remove any MongoDB _id fields from entries
-                self.json_data = [
-                    {k: v for k, v in item.items() if k != '_id'}
-                    if isinstance(item, dict) else item
-                    for item in data
-                ]
+                # Remove any MongoDB _id fields from entries, in place rather than copying every dict
+                for item in data:
+                    if isinstance(item, dict):
+                        item.pop('_id', None)
+                self.json_data = data
             else:
                 print(f"File {self.json_path} does not exist or is empty.")
                 self.json_data = []
@@ -59,6 +91,13 @@ class RAGRetriever:
             print(f"Error loading JSON file {self.json_path}: {e}")
             self.json_data = []
     
+    def _file_mtime(self):
+        """Get the JSON file's modification time, or None if it doesn't exist"""
+        try:
+            return os.stat(self.json_path).st_mtime_ns
+        except OSError:
+            return None
+    
     def setup_elasticsearch(self):
         """Setup Elasticsearch index with basic settings"""
         try:
@@ -87,6 +126,10 @@ class RAGRetriever:
             # Index the data
             if self.json_data:
                 self._index_data()
+            
+            # Remember what the index holds so unchanged data isn't reindexed
+            if self.es_available:
+                self._indexed_hash = self._data_hash
                 
         except Exception as e:
             print(f"Error setting up Elasticsearch: {e}")
@@ -95,32 +138,63 @@ class RAGRetriever:
     def _index_data(self):
         """Index data into Elasticsearch with basic indexing"""
         try:
-            actions = []
-            
-            for i, user in enumerate(self.json_data):
-                user_str = json.dumps(user)
-                
-                # Create document for indexing - simplified
-                doc = {
-                    "_index": self.index_name,
-                    "_id": f"user_{i}",
-                    "_source": {
-                        "user_data": user,
-                        "text": user_str
-                    }
-                }
-                
-                actions.append(doc)
-            
-            # Bulk index documents
-            if actions:
-                success, failed = bulk(self.es_client, actions)
+            if self.json_data:
+                # Skip periodic refreshes while loading; one refresh at the end makes everything searchable
+                self.es_client.indices.put_settings(index=self.index_name, settings={"refresh_interval": "-1"})
+                try:
+                    # Generate documents lazily so they are sent in chunks without building one big list
+                    success, failed = 0, 0
+                    for ok, _ in streaming_bulk(
+                        self.es_client,
+                        self._index_actions(),
+                        chunk_size=_INDEX_CHUNK_SIZE,
+                        max_chunk_bytes=_INDEX_CHUNK_BYTES,
+                        raise_on_error=False,
+                        request_timeout=60
+                    ):
+                        if ok:
+                            success += 1
+                        else:
+                            failed += 1
+                finally:
+                    self.es_client.indices.put_settings(index=self.index_name, settings={"refresh_interval": "1s"})
+                    self.es_client.indices.refresh(index=self.index_name)
                 print(f"Indexed {success} documents into Elasticsearch. Failed: {failed}")
                 
         except Exception as e:
             print(f"Error indexing data: {e}")
             self.es_available = False
     
+    def _index_actions(self):
+        """Yield a bulk index action for each user
+        
+        Yields:
+            dict: Document for indexing
+        """
+        for i, user in enumerate(self.json_data):
+            # Create document for indexing - simplified
+            yield {
+                "_index": self.index_name,
+                "_id": f"user_{i}",
+                "_source": {
+                    "user_data": user,
+                    "text": self._to_text(user)
+                }
+            }
+    
+    def _to_text(self, user):
+        """Build the searchable text for a user
+        
+        Args:
+            user: User record from the JSON file
+            
+        Returns:
+            str: Compact "key: value" pairs, skipping empty values
+        """
+        if not isinstance(user, dict):
+            return orjson.dumps(user, default=str).decode()
+        return " | ".join(f"{k}: {v}" for k, v in user.items() if v not in (None, "", [], {}))
+    
     def retrieve_context(self, query, n_results=2):
         """Retrieve context based on the query
         
@@ -131,44 +205,160 @@ class RAGRetriever:
         Returns:
             list: List of retrieved documents.
         """
-        # Always refresh data from file to ensure we have the latest
-        self.load_data()
+        # Reload only when the file has changed since it was last read
+        if self._file_mtime() != self._mtime:
+            self.load_data()
+            self._clear_search_cache()
+        
+        # If no Elasticsearch or no data, return first n results from file
+        if not self.es_available or not self.json_data:
+            return self.json_data[:n_results]
+        
+        key = (self._cache_key(query), n_results)
+        with self._search_cache_lock:
+            cached = self._search_cache.get(key)
+        if cached is None:
+            try:
+                # Elasticsearch analyses the original text; the normalized form is only the cache key
+                cached = self._retrieve(query, n_results)
+            except Exception as e:
+                print(f"Error retrieving context: {e}")
+                # Fall back to the first n items from json_data, uncached so the next call retries
+                return self.json_data[:n_results]
+            with self._search_cache_lock:
+                self._search_cache[key] = cached
+        
+        return list(cached)
+    
+    def _cache_key(self, query):
+        """Normalize a query for the search cache
+        
+        The standard analyzer lowercases and never joins terms across whitespace,
+        so lowercased whitespace-separated chunks in any order analyze to the same
+        terms, and a match query scores them the same.
+        
+        Args:
+            query (str): The query to search for.
+            
+        Returns:
+            str: Sorted, lowercased chunks of the query.
+        """
+        return " ".join(sorted(query.lower().split()))
+    
+    def _clear_search_cache(self):
+        """Drop all memoized searches"""
+        with self._search_cache_lock:
+            self._search_cache.clear()
+    
+    async def aretrieve_context(self, query, n_results=2):
+        """Async version of retrieve_context
+        
+        Runs the search on a worker thread so callers on an event loop can
+        overlap it with other work. The client's connection pool is thread-safe.
+        """
+        return await asyncio.to_thread(self.retrieve_context, query, n_results)
+    
+    def _retrieve(self, query, n_results):
+        """Search Elasticsearch for the query, uncached
+        
+        Args:
+            query (str): The query to search for.
+            n_results (int): The number of results to return.
+            
+        Returns:
+            list: List of retrieved documents.
+            
+        Raises:
+            Exception: If the search fails, so the caller doesn't cache a fallback.
+        """
+        response = self.es_client.search(index=self.index_name, body=self._search_body(query, n_results))
+        return self._hits_to_docs(response, n_results)
+    
+    def retrieve_context_batch(self, queries, n_results=2):
+        """Retrieve context for several queries in one Elasticsearch round trip
+        
+        Args:
+            queries (list): The queries to search for.
+            n_results (int, optional): The number of results to return per query. Defaults to 2.
+            
+        Returns:
+            list: List of retrieved documents for each query, in order.
+        """
+        if not queries:
+            return []
+        
+        # Reload only when the file has changed since it was last read
+        if self._file_mtime() != self._mtime:
+            self.load_data()
+            self._clear_search_cache()
         
         # If no Elasticsearch or no data, return first n results from file
         if not self.es_available or not self.json_data:
-            return self.json_data[:min(n_results, len(self.json_data))]
+            return [self.json_data[:n_results] for _ in queries]
         
         try:
-            # Use simple match query for text search
-            search_body = {
-                "size": n_results,
-                "query": {
-                    "match": {
-                        "text": query
-                    }
-                }
-            }
+            # One header/body pair per query, all sent in a single msearch request
+            searches = []
+            for query in queries:
+                searches.append({})
+                searches.append(self._search_body(query, n_results))
             
-            # Execute search
-            response = self.es_client.search(index=self.index_name, body=search_body)
+            response = self.es_client.msearch(index=self.index_name, searches=searches)
             
-            # Extract and return results
-            relevant_docs = []
-            for hit in response["hits"]["hits"]:
-                user_data = hit["_source"]["user_data"]
-                relevant_docs.append(user_data)
-                
-            return relevant_docs if relevant_docs else self.json_data[:min(n_results, len(self.json_data))]
+            # A failed search only falls back for its own query
+            return [
+                self._hits_to_docs(result, n_results) if "error" not in result else self.json_data[:n_results]
+                for result in response["responses"]
+            ]
             
         except Exception as e:
             print(f"Error retrieving context: {e}")
             # Fallback to returning the first n items from json_data
-            return self.json_data[:min(n_results, len(self.json_data))]
+            return [self.json_data[:n_results] for _ in queries]
+    
+    def _search_body(self, query, n_results):
+        """Build the search request for a query
+        
+        Args:
+            query (str): The query to search for.
+            n_results (int): The number of results to return.
+            
+        Returns:
+            dict: Search request body.
+        """
+        # Use simple match query for text search; only the stored record is read back
+        return {
+            "size": n_results,
+            "_source": ["user_data"],
+            "query": {
+                "match": {
+                    "text": query
+                }
+            }
+        }
+    
+    def _hits_to_docs(self, response, n_results):
+        """Extract the user documents from a search response
+        
+        Args:
+            response (dict): Search response.
+            n_results (int): The number of results requested, for the fallback.
+            
+        Returns:
+            list: List of retrieved documents.
+        """
+        relevant_docs = [hit["_source"]["user_data"] for hit in response["hits"]["hits"]]
+        return relevant_docs if relevant_docs else self.json_data[:n_results]
     
     def refresh_data(self):
         """Refresh data by reloading JSON and reindexing"""
         self.load_data()
         
+        # Nothing to reindex if the file contents match what the index already holds
+        if self.es_available and self._data_hash is not None and self._data_hash == self._indexed_hash:
+            self._clear_search_cache()
+            return
+        
         if self.es_available:
             try:
                 # Wait a bit to allow any database operations to complete
@@ -177,4 +367,7 @@ class RAGRetriever:
             except Exception as e:
                 print(f"Error refreshing Elasticsearch data: {e}")
                 # Continue without Elasticsearch
-                self.es_available = False
\ No newline at end of file
+                self.es_available = False
+        
+        # Drop searches cached against the old data, including any made while reindexing
+        self._clear_search_cache()
@@ -1,7 +1,12 @@
 import os
+import re
 import json
+import orjson
 from typing import Dict, Any, Optional
 
+# Compiled once at import; validate_email matches it against the whole address
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+')
+
 
 def load_json_file(file_path: str) -> Any:
     """
@@ -15,8 +20,8 @@ def load_json_file(file_path: str) -> Any:
     """
     try:
         if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            with open(file_path, 'r') as f:
-                return json.load(f)
+            with open(file_path, 'rb') as f:
+                return orjson.loads(f.read())
         else :
             print(f"File {file_path} does not exist or is empty.")
             return None
@@ -39,9 +44,14 @@ def save_json_file(file_path: str, data: Any) -> bool:
         bool: True if the data was saved successfully, False otherwise.
     """
     try:
-        with open(file_path, 'w') as f:
-            # Use default=str to serialize non-serializable types (e.g., ObjectId) as strings
-            json.dump(data, f, indent=2, default=str)
+        # Use default=str to serialize non-serializable types (e.g., ObjectId) as strings
+        payload = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY, default=str)
+        
+        # Write to a temporary file and rename it over the target, so readers never see a partial file
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         print(f"Error saving JSON file {file_path}: {e}")
@@ -60,9 +70,7 @@ def validate_email(email: str) -> bool:
     Returns:
         bool: True if the email is valid, False otherwise.
     """
-    import re
-    pattern = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
-    return bool(re.match(pattern, email) )
+    return _EMAIL_RE.fullmatch(email) is not None
 
 
 
@@ -77,15 +85,36 @@ def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
     Returns:
         Optional[Dict[str, Any]]: The extracted JSON data, or None if no valid JSON was found.
     """
-    import re
     try:
-        match = re.search(r'\{(?:[^{}]|(?R))*\}', text)
-        if match:
-            json_str = match.group(0)
-            return json.loads(json_str)
-        else:
+        start = text.find("{")
+        if start < 0:
             # No JSON object found in the text
             return None
+        
+        # Walk to the brace that closes the first object, ignoring braces inside strings
+        depth = 0
+        in_string = False
+        escaped = False
+        for end in range(start, len(text)):
+            char = text[end]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return orjson.loads(text[start:end + 1])
+        
+        # The object is never closed
+        return None
     except Exception as e:
         print(f"Error extracting JSON from text: {e}")
         return None